@@ -25,6 +25,7 @@ import unittest
 import frappe
 import frappe.utils.scheduler
 from frappe.tests.utils import make_test_records
+from frappe.tests.utils.generators import _clear_dependency_caches
 
 from .runner import TestRunnerError
 from .utils import debug_timer
@@ -52,6 +53,9 @@ def _initialize_test_environment(site, config):
 	frappe.flags.print_messages = logger.getEffectiveLevel() < logging.INFO
 	frappe.flags.tests_verbose = logger.getEffectiveLevel() < logging.INFO
 
+	# Start each test session with a fresh test record dependency cache
+	_clear_dependency_caches()
+
 
 def _cleanup_after_tests():
 	"""Perform cleanup operations after running tests"""
@@ -0,0 +1,190 @@
+import datetime
+import json
+import os
+from decimal import Decimal
+from types import ModuleType
+from unittest.mock import patch
+
+import orjson
+
+import frappe
+from frappe.tests import IntegrationTestCase, UnitTestCase
+from frappe.tests.utils import generators
+from frappe.tests.utils.generators import get_missing_records_doctypes
+
+# doctype -> [(fieldtype, options)], in field order
+DOCFIELDS = {
+	"Sales Order": [
+		("Link", "Customer"),
+		("Link", "Company"),
+		("Link", "[Select]"),
+		("Table", "Sales Order Item"),
+	],
+	"Sales Order Item": [("Link", "Item"), ("Link", "Company")],
+	"Customer": [("Link", "Territory"), ("Link", "Company")],
+	"Territory": [("Link", "Territory")],
+	"Company": [("Link", "Currency")],
+	"Item": [("Link", "Item Group"), ("Link", "UOM")],
+}
+CUSTOM_FIELDS = {
+	"Customer": [("Link", "Customer Group")],
+}
+
+
+def _test_module(name, **overrides):
+	module = ModuleType(name)
+	module.__dict__.update(overrides)
+	return module
+
+
+TEST_MODULES = {
+	"Sales Order": _test_module("test_sales_order", EXTRA_TEST_RECORD_DEPENDENCIES=["Project"]),
+	"Item": _test_module("test_item", IGNORE_TEST_RECORD_DEPENDENCIES=["UOM"]),
+}
+
+
+def fake_get_all(doctype, filters, fields, **kwargs):
+	if doctype == "DocType":
+		return [(name, "Test") for name in filters["name"][1]]
+	source, parent_key = (DOCFIELDS, "parent") if doctype == "DocField" else (CUSTOM_FIELDS, "dt")
+	fieldtypes = filters["fieldtype"][1]
+	return [
+		frappe._dict({parent_key: parent, "fieldtype": fieldtype, "options": options})
+		for parent in filters[parent_key][1]
+		for fieldtype, options in source.get(parent, [])
+		if fieldtype in fieldtypes
+	]
+
+
+class TestTestRecordDependencies(UnitTestCase):
+	def setUp(self):
+		self.mocks = {}
+		generators._clear_dependency_caches()
+		self.addCleanup(generators._clear_dependency_caches)
+		for target, side_effect in (
+			("frappe.get_all", fake_get_all),
+			(
+				"frappe.tests.utils.generators._get_test_module",
+				lambda doctype, module: TEST_MODULES.get(doctype),
+			),
+		):
+			patcher = patch(target, side_effect=side_effect)
+			self.mocks[target.rsplit(".", 1)[-1]] = patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def test_dependency_first_order(self):
+		# custom fields are visited last here; the meta would place them at their insert_after position
+		self.assertEqual(
+			get_missing_records_doctypes("Sales Order"),
+			[
+				"Territory",
+				"Currency",
+				"Company",
+				"Customer Group",
+				"Customer",
+				"Item Group",
+				"Item",
+				"Project",
+				"Sales Order",
+			],
+		)
+
+	def test_queries_per_layer(self):
+		get_missing_records_doctypes("Sales Order")
+		# per layer: DocField, Custom Field and DocType; plus the fields of the one child table
+		self.assertEqual(self.mocks["get_all"].call_count, 3 * 3 + 2)
+
+	def test_overrides_and_select_are_applied(self):
+		self.assertEqual(generators._link_deps("Sales Order"), ("Customer", "Company", "Item", "Project"))
+		self.assertEqual(generators._link_deps("Item"), ("Item Group",))
+
+	def test_custom_field_links_are_followed(self):
+		self.assertIn("Customer Group", generators._link_deps("Customer"))
+
+	def test_visited_doctypes_are_pruned(self):
+		visited = {"Customer"}
+		self.assertEqual(
+			get_missing_records_doctypes("Sales Order", visited),
+			["Currency", "Company", "Item Group", "Item", "Project", "Sales Order"],
+		)
+		self.assertNotIn("Territory", visited)
+		self.assertEqual(get_missing_records_doctypes("Sales Order", visited), [])
+
+
+class TestTestRecordModuleOverrides(UnitTestCase):
+	def test_public_overrides_are_lists(self):
+		self.assertEqual(
+			generators.get_missing_records_module_overrides(TEST_MODULES["Item"]),
+			([], ["UOM"]),
+		)
+
+	def test_reload_refreshes_overrides(self):
+		module = _test_module("test_reloaded", EXTRA_TEST_RECORD_DEPENDENCIES=["Project"])
+		self.assertEqual(generators._overrides_for(module), (("Project",), ()))
+
+		module.EXTRA_TEST_RECORD_DEPENDENCIES = ["Task"]
+		with (
+			patch("frappe.tests.utils.generators.load_doctype_module", return_value=module),
+			patch("frappe.tests.utils.generators.reload") as reload,
+			patch.dict(os.environ, FRAPPE_TEST_RELOAD="1"),
+			patch.object(frappe, "conf", frappe._dict(developer_mode=1)),
+		):
+			generators._get_test_module.__wrapped__("Reloaded", "Test")
+
+		reload.assert_called_once_with(module)
+		self.assertEqual(generators._overrides_for(module), (("Task",), ()))
+
+
+class TestTestRecordSync(IntegrationTestCase):
+	INDEX_DOCTYPE = "_Test Record Generators"
+
+	def sync(self, records, **kwargs) -> list[tuple[str, str]]:
+		self.addCleanup(frappe.local.test_objects.pop, self.INDEX_DOCTYPE, None)
+		self.addCleanup(generators.TestRecordManager().remove, self.INDEX_DOCTYPE)
+		return [
+			(tag, doc.name)
+			for tag, doc in generators._sync_records(self.INDEX_DOCTYPE, {"Tag": records}, **kwargs)
+		]
+
+	def test_duplicate_names_are_created_once(self):
+		name = "_Test Generator Tag"
+		self.assertEqual(self.sync([{"name": name}, {"name": name}]), [("created", name), ("loaded", name)])
+
+	def test_name_variant_of_existing_record(self):
+		name = "_Test Generator Tag Variant"
+		frappe.get_doc({"doctype": "Tag", "name": name}).insert()
+		variant = name.lower()
+
+		# whether the variant matches depends on the collation of the database
+		if frappe.db.exists("Tag", variant):
+			self.assertEqual(self.sync([{"name": variant}]), [("loaded", name)])
+		else:
+			self.assertEqual(self.sync([{"name": variant}]), [("created", variant)])
+
+	def test_log_entry_encoders_agree(self):
+		entry = {
+			"doctype": self.INDEX_DOCTYPE,
+			"records": [
+				frappe.get_doc({"doctype": "ToDo", "description": "Café", "date": datetime.date(2024, 1, 1)}),
+				{"name": "Über", "amount": Decimal("1.5"), "at": datetime.datetime(2024, 1, 1, 12, 30)},
+			],
+		}
+		with patch.object(generators, "orjson", orjson):
+			encoded = generators._dump_log_entry(entry)
+		with patch.object(generators, "orjson", None):
+			fallback_encoded = generators._dump_log_entry(entry)
+
+		self.assertEqual(orjson.loads(encoded), json.loads(fallback_encoded))
+		self.assertEqual(json.loads(encoded)["records"][1]["at"], "2024-01-01 12:30:00")
+
+	def test_grouped_commits(self):
+		# 5 records: a commit per full batch and a final one; a batch size below 1 is clamped to 1
+		for batch, commits in ((2, 2 + 1), (0, 5 + 1)):
+			records = [{"name": f"_Test Generator Tag Commit {batch}-{i}"} for i in range(5)]
+			with (
+				self.subTest(test_commit_batch=batch),
+				patch.dict(frappe.conf, {"test_commit_batch": batch}),
+				patch.object(frappe.db, "commit") as commit,
+			):
+				self.sync(records, commit=True)
+				self.assertEqual(commit.call_count, commits)
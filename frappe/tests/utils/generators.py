@@ -2,19 +2,28 @@ import datetime
 import json
 import logging
 import os
+import threading
 from collections import defaultdict
 from collections.abc import Generator
-from functools import cache
+from functools import lru_cache
 from importlib import reload
 from pathlib import Path
 from types import MappingProxyType, ModuleType
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, ClassVar
+from weakref import WeakKeyDictionary
 
 import tomli
 
+try:
+	import orjson
+except ImportError:  # optional, speeds up the test record log
+	orjson = None
+
 import frappe
-from frappe.model.naming import revert_series_if_last
+from frappe.deprecation_dumpster import deprecation_warning
+from frappe.model import table_fields
 from frappe.modules import get_doctype_module, get_module_path, load_doctype_module
+from frappe.utils import cint
 
 if TYPE_CHECKING:
 	from frappe.model.document import Document
@@ -24,6 +33,8 @@ testing_logger = logging.getLogger("frappe.testing.generators")
 
 datetime_like_types = (datetime.datetime, datetime.date, datetime.time, datetime.timedelta)
 
+_json_loads = orjson.loads if orjson else json.loads
+
 __all__ = [
 	"get_modules",
 	"get_missing_records_doctypes",
@@ -35,21 +46,29 @@ __all__ = [
 ]
 
 
-@cache
+@lru_cache(maxsize=2048)
 def get_modules(doctype) -> tuple[str, ModuleType]:
 	"""Get the modules for the specified doctype"""
 	module = frappe.db.get_value("DocType", doctype, "module")
+	return module, _get_test_module(doctype, module)
+
+
+@lru_cache(maxsize=2048)
+def _get_test_module(doctype, module) -> ModuleType | None:
 	try:
 		test_module = load_doctype_module(doctype, module, "test_")
-		if test_module:
+		# reloading re-executes the module body; only do it when explicitly asked for
+		if test_module and frappe.conf.get("developer_mode") and os.environ.get("FRAPPE_TEST_RELOAD"):
 			reload(test_module)
+			# reload keeps the module object; drop what was derived from its previous state
+			_module_overrides.pop(test_module, None)
+			_link_graph.clear()
 	except ImportError:
 		test_module = None
 
-	return module, test_module
+	return test_module
 
 
-# @cache - don't cache the recursion, code depends on its recurn value declining
 def get_missing_records_doctypes(doctype, visited=None) -> list[str]:
 	"""Get the dependencies for the specified doctype in a depth-first manner"""
 
@@ -60,62 +79,167 @@ def get_missing_records_doctypes(doctype, visited=None) -> list[str]:
 	if doctype in visited:
 		return []
 
-	# Mark as visited
-	visited.add(doctype)
+	return _toposort(doctype, visited)
 
-	module, test_module = get_modules(doctype)
-	meta = frappe.get_meta(doctype)
-	link_fields = meta.get_link_fields()
 
-	for df in meta.get_table_fields():
-		link_fields.extend(frappe.get_meta(df.options).get_link_fields())
+def _toposort(root, visited) -> list[str]:
+	"""Get root and its transitive dependencies in dependency-first order
 
-	unique_doctypes = dict.fromkeys(df.options for df in link_fields if df.options != "[Select]")
+	Iterative post-order traversal with an explicit stack over the cached link graph;
+	doctypes in visited are neither listed nor walked into, visited is updated in place."""
+	_prefetch_link_graph([root])
 
-	to_add, to_remove = get_missing_records_module_overrides(test_module)
-	unique_doctypes.update(dict.fromkeys(to_add))
-	if to_remove:
-		unique_doctypes = {k: v for k, v in unique_doctypes.items() if k not in to_remove}
+	visited.add(root)
+	order = []
+	stack = [(root, iter(_link_deps(root)))]
+	while stack:
+		doctype, children = stack[-1]
+		for dep_doctype in children:
+			if dep_doctype not in visited:
+				visited.add(dep_doctype)
+				stack.append((dep_doctype, iter(_link_deps(dep_doctype))))
+				break
+		else:
+			# children exhausted
+			stack.pop()
+			order.append(doctype)
 
-	# Recursive depth-first traversal
-	result = []
-	for dep_doctype in unique_doctypes:
-		result.extend(get_missing_records_doctypes(dep_doctype, visited))
+	return order
 
-	result.append(doctype)
-	return result
 
+# Doctype -> doctypes its test records depend on; a pure function of DocType meta
+# and test module overrides, hence safe to keep for the lifetime of a test run
+_link_graph: dict[str, tuple[str, ...]] = {}
 
-def get_missing_records_module_overrides(module) -> [list, list]:
-	to_add = []
-	to_remove = []
-	if hasattr(module, "test_dependencies"):
-		from frappe.deprecation_dumpster import deprecation_warning
 
-		deprecation_warning(
-			"2024-10-09",
-			"v17",
-			"""test_dependencies was clarified to EXTRA_TEST_RECORD_DEPENDENCIES; migration script: https://github.com/frappe/frappe/pull/28060""",
-		)
-		to_add += module.test_dependencies
+def _link_deps(doctype) -> tuple[str, ...]:
+	"""Get the doctypes the test records of doctype depend on, including module overrides"""
+	if doctype not in _link_graph:
+		_prefetch_link_graph([doctype])
+	return _link_graph[doctype]
 
-	if hasattr(module, "EXTRA_TEST_RECORD_DEPENDENCIES"):
-		to_add += module.EXTRA_TEST_RECORD_DEPENDENCIES
 
-	if hasattr(module, "test_ignore"):
-		from frappe.deprecation_dumpster import deprecation_warning
+def _prefetch_link_graph(seed_doctypes) -> dict[str, tuple[str, ...]]:
+	"""Populate the link graph for all doctypes reachable from seed_doctypes
 
-		deprecation_warning(
-			"2024-10-09",
-			"v17",
-			"""test_ignore was clarified to IGNORE_TEST_RECORD_DEPENDENCIES; migration script: https://github.com/frappe/frappe/pull/28060""",
+	Walks breadth-first and fetches the fields of a whole layer at once,
+	instead of loading the meta of every doctype on the way."""
+	frontier = [doctype for doctype in dict.fromkeys(seed_doctypes) if doctype not in _link_graph]
+	while frontier:
+		fields = _get_link_and_table_fields(frontier)
+		child_doctypes = {df.options for dfs in fields.values() for df in dfs if df.fieldtype in table_fields}
+		child_fields = _get_link_and_table_fields(child_doctypes)
+		modules = dict(
+			frappe.get_all(
+				"DocType", filters={"name": ("in", frontier)}, fields=["name", "module"], as_list=True
+			)
 		)
-		to_remove += module.test_ignore
 
-	if hasattr(module, "IGNORE_TEST_RECORD_DEPENDENCIES"):
-		to_remove += module.IGNORE_TEST_RECORD_DEPENDENCIES
+		for doctype in frontier:
+			test_module = _get_test_module(doctype, modules.get(doctype))
+			# a single insertion-ordered dict keeps the traversal order deterministic
+			unique_doctypes = dict.fromkeys(df.options for df in fields[doctype] if df.fieldtype == "Link")
+			for df in fields[doctype]:
+				if df.fieldtype in table_fields:
+					for cdf in child_fields[df.options]:
+						if cdf.fieldtype == "Link":
+							unique_doctypes[cdf.options] = None
+
+			to_add, to_remove = _overrides_for(test_module)
+			for dep_doctype in to_add:
+				unique_doctypes[dep_doctype] = None
+			for dep_doctype in (*to_remove, "[Select]", None):
+				unique_doctypes.pop(dep_doctype, None)
+			_link_graph[doctype] = tuple(unique_doctypes)
+
+		frontier = [
+			dep_doctype
+			for dep_doctype in dict.fromkeys(dep for doctype in frontier for dep in _link_graph[doctype])
+			if dep_doctype not in _link_graph
+		]
+
+	return _link_graph
+
+
+def _get_link_and_table_fields(doctypes) -> defaultdict[str, list]:
+	"""Get Link and Table fields, standard and custom, of the given doctypes in one go
+
+	Unlike in the meta, custom fields come after all standard fields instead of at their
+	insert_after position, so the order among dependencies of a doctype may differ."""
+	fields = defaultdict(list)
+	if not doctypes:
+		return fields
+
+	fieldtypes = ("Link", *table_fields)
+	for df in frappe.get_all(
+		"DocField",
+		filters={"parent": ("in", list(doctypes)), "parenttype": "DocType", "fieldtype": ("in", fieldtypes)},
+		fields=["parent", "fieldtype", "options"],
+		order_by="idx asc",
+	):
+		fields[df.parent].append(df)
+	for df in frappe.get_all(
+		"Custom Field",
+		filters={"dt": ("in", list(doctypes)), "fieldtype": ("in", fieldtypes)},
+		fields=["dt", "fieldtype", "options"],
+		order_by="idx asc",
+	):
+		fields[df.dt].append(df)
+
+	return fields
+
+
+def _clear_dependency_caches():
+	_link_graph.clear()
+
+
+# (module attribute, adds dependencies, deprecation note)
+_OVERRIDE_KEYS = (
+	(
+		"test_dependencies",
+		True,
+		"""test_dependencies was clarified to EXTRA_TEST_RECORD_DEPENDENCIES; migration script: https://github.com/frappe/frappe/pull/28060""",
+	),
+	("EXTRA_TEST_RECORD_DEPENDENCIES", True, None),
+	(
+		"test_ignore",
+		False,
+		"""test_ignore was clarified to IGNORE_TEST_RECORD_DEPENDENCIES; migration script: https://github.com/frappe/frappe/pull/28060""",
+	),
+	("IGNORE_TEST_RECORD_DEPENDENCIES", False, None),
+)
+
+
+# module -> (to_add, to_remove); overrides are fixed once a test module is imported
+_module_overrides: WeakKeyDictionary[ModuleType, tuple[tuple[str, ...], tuple[str, ...]]] = (
+	WeakKeyDictionary()
+)
+
+
+def get_missing_records_module_overrides(module) -> [list, list]:
+	to_add, to_remove = _overrides_for(module)
+	return list(to_add), list(to_remove)
+
 
-	return to_add, to_remove
+def _overrides_for(module) -> tuple[tuple[str, ...], tuple[str, ...]]:
+	if module is None:
+		return (), ()
+	if module not in _module_overrides:
+		_module_overrides[module] = _get_module_overrides(module)
+	return _module_overrides[module]
+
+
+def _get_module_overrides(module) -> tuple[tuple[str, ...], tuple[str, ...]]:
+	to_add = []
+	to_remove = []
+	ns = getattr(module, "__dict__", {})
+	for name, adds, deprecation_note in _OVERRIDE_KEYS:
+		if name in ns:
+			if deprecation_note:
+				deprecation_warning("2024-10-09", "v17", deprecation_note)
+			(to_add if adds else to_remove).extend(ns[name])
+
+	return tuple(to_add), tuple(to_remove)
 
 
 def load_test_records_for(index_doctype) -> dict[str, Any] | list:
@@ -124,8 +248,6 @@ def load_test_records_for(index_doctype) -> dict[str, Any] | list:
 	json_path = os.path.join(module_path, "test_records.json")
 	if os.path.exists(json_path):
 		if not frappe.flags.deprecation_dumpster_invoked:
-			from frappe.deprecation_dumpster import deprecation_warning
-
 			deprecation_warning(
 				"2024-10-09",
 				"v18",
@@ -154,6 +276,9 @@ def _generate_all_records_towards(
 	# NOTE: visited excludes dependency discovery of any index doctype which
 	# which had already been loaded into memory prior
 	visited = set(frappe.local.test_objects.keys())
+	# NOTE: records are created sequentially on purpose: they live in the open
+	# transaction of the current connection until the test case rolls back, so
+	# they aren't visible to (nor undone with) records made on other connections
 	for _index_doctype in get_missing_records_doctypes(index_doctype, visited):
 		# Create all test records and yield
 		res = list(
@@ -209,10 +334,6 @@ def _generate_records_for(
 		yield from _sync_records(index_doctype, test_records, reset=reset, commit=commit)
 
 
-global test_record_manager_instance
-test_record_manager_instance = None
-
-
 def _sync_records(
 	index_doctype: str, test_records: dict[str, list], reset: bool = False, commit: bool = False
 ) -> Generator[tuple[str, "Document"], None, None]:
@@ -227,25 +348,51 @@ def _sync_records(
 	# persistence log indexed by the register doctype. It also serves as proof of
 	# records at the time of creation and contains the db values
 
-	global test_record_manager_instance
-	if test_record_manager_instance is None:
-		test_record_manager_instance = TestRecordManager()
+	test_record_manager_instance = TestRecordManager()
 
 	def _load(do_create=True):
 		created, loaded = [], []
+		# group commits instead of committing after each record
+		commit_every = max(cint(frappe.conf.get("test_commit_batch", 100)), 1)
 		# one test record file / source under a single register doctype may have entires for different doctypes
 		for _sub_doctype, records in test_records.items():
+			# records with a predetermined name are checked for existence in bulk
+			names = set()
+			if do_create and not reset:
+				names = {record["name"] for record in records if record.get("name")}
+			existing = _get_existing_names(_sub_doctype, names)
+			# if the database collation matched names which differ from the given ones (case,
+			# accents, trailing spaces, ...), leave the remaining named records to db.exists()
+			bulk_check_exact = existing <= names
+			if do_create:
+				has_naming_series = bool(frappe.get_meta(_sub_doctype).get_field("naming_series"))
+				default_naming_series = "_T-" + _sub_doctype + "-" if has_naming_series else None
 			for record in records:
 				# Fix the input; better late than never
 				if "doctype" not in record:
 					record["doctype"] = _sub_doctype
 
 				if do_create:
-					doc, was_created = _try_create(record, reset, commit)
-					if was_created:
-						created.append(doc)
+					if record.get("name") in existing:
+						# do not create test records, if already exists
+						loaded.append(frappe.get_doc(record["doctype"], record["name"]))
 					else:
-						loaded.append(doc)
+						# missing as per the bulk check, kept up to date with the records created so far
+						known_missing = (
+							not reset
+							and bool(record.get("name"))
+							and bulk_check_exact
+							and record["name"] not in existing
+						)
+						doc, was_created = _try_create(record, default_naming_series, reset, known_missing)
+						if was_created:
+							created.append(doc)
+							# e.g. the same name given twice
+							existing.add(doc.name)
+							if commit and len(created) % commit_every == 0:
+								frappe.db.commit()
+						else:
+							loaded.append(doc)
 
 				# Important: we load the raw data records into globalTestRecords
 				# which best suites the test engineers intentions and expectations
@@ -256,6 +403,8 @@ def _sync_records(
 			_logstr = f"{index_doctype} ({len(loaded)})"
 			testing_logger.info(f"         > {_logstr:<30} into cls.globalTestRecords, only")
 		else:
+			if commit and created:
+				frappe.db.commit()
 			# we keep an mpty created = [] on purpose to persist proof of prior processing of the index doctype
 			test_record_manager_instance.add(index_doctype, created)
 			_logstr = f"{index_doctype} ({len(created)} / {len(loaded) + len(created)})"
@@ -292,28 +441,39 @@ def _sync_records(
 		yield from _load()
 
 
-def _try_create(record, reset=False, commit=False) -> tuple["Document", bool]:
-	"""Create a single test document from the given record data."""
+def _get_existing_names(doctype, names) -> set[str]:
+	"""Get the names, as stored, of records of doctype matching the given names in the database"""
+	if not names:
+		return set()
+	return set(frappe.get_all(doctype, filters={"name": ("in", list(names))}, pluck="name"))
 
-	def revert_naming(d):
-		if getattr(d, "naming_series", None):
-			revert_series_if_last(d.naming_series, d.name)
 
-	if not reset:
+def _try_create(
+	record, default_naming_series: str | None = None, reset=False, known_missing=False
+) -> tuple["Document", bool]:
+	"""Create a single test document from the given record data.
+
+	`default_naming_series` is set on documents without one; pass None for doctypes without a naming series.
+	`known_missing` skips the savepoint and existence check for named records known to be missing;
+	should such a record exist after all, inserting it fails instead of silently merging into it."""
+
+	check_exists = not reset and not known_missing
+	if check_exists:
 		frappe.db.savepoint("creating_test_record")
 
-	d = frappe.copy_doc(record)
+	# records are plain dicts from test sources, no need for copy_doc's deepcopy;
+	# get_doc doesn't modify the record itself, only sets the doctype on child row dicts
+	d = frappe.get_doc(record)
 
-	if d.meta.get_field("naming_series"):
-		if not d.naming_series:
-			d.naming_series = "_T-" + d.doctype + "-"
+	if default_naming_series and not d.naming_series:
+		d.naming_series = default_naming_series
 
 	if record.get("name"):
 		d.name = record.get("name")
 	else:
 		d.set_new_name()
 
-	if frappe.db.exists(d.doctype, d.name) and not reset:
+	if check_exists and frappe.db.exists(d.doctype, d.name):
 		frappe.db.rollback(save_point="creating_test_record")
 		# do not create test records, if already exists
 		return frappe.get_doc(d.doctype, d.name), False
@@ -324,19 +484,18 @@ def _try_create(record, reset=False, commit=False) -> tuple["Document", bool]:
 	d.docstatus = 0
 
 	d.run_method("before_test_insert")
-	d.insert(ignore_if_duplicate=True)
+	d.insert(ignore_if_duplicate=not known_missing)
 
 	if docstatus == 1:
 		d.submit()
 
-	if commit:
-		frappe.db.commit()
-
 	return d, True
 
 
 def print_mandatory_fields(doctype, initial_doctype):
 	"""Print mandatory fields for the specified doctype"""
+	if not testing_logger.isEnabledFor(logging.DEBUG):
+		return
 	meta = frappe.get_meta(doctype)
 	msg = []
 	head = f"Missing - {doctype:<30}"
@@ -360,14 +519,34 @@ PERSISTENT_TEST_LOG_FILE = ".test_records.jsonl"
 
 
 class TestRecordManager:
-	def __init__(self):
-		testing_logger.debug(f"{self} initialized")
-		self.log_file = Path(frappe.get_site_path(PERSISTENT_TEST_LOG_FILE))
-		self._log = None
+	"""Per-site, process-wide log of created test records; instantiating returns the shared instance"""
+
+	_instances: ClassVar[dict[Path, "TestRecordManager"]] = {}
+	_lock = threading.Lock()
+
+	def __new__(cls):
+		log_file = Path(frappe.get_site_path(PERSISTENT_TEST_LOG_FILE))
+		with cls._lock:
+			if (instance := cls._instances.get(log_file)) is None:
+				instance = super().__new__(cls)
+				instance.log_file = log_file
+				instance._log = None
+				cls._instances[log_file] = instance
+				testing_logger.debug(f"{instance} initialized")
+		return instance
+
+	@classmethod
+	def discard(cls):
+		"""Drop the shared instance of the current site, e.g. after its log file was removed"""
+		log_file = Path(frappe.get_site_path(PERSISTENT_TEST_LOG_FILE))
+		with cls._lock:
+			cls._instances.pop(log_file, None)
 
 	def get(self):
 		if self._log is None:
-			self._log = self._read_log()
+			with self._lock:
+				if self._log is None:
+					self._log = self._read_log()
 		return self._log
 
 	def get_records(self, index_doctype) -> list["Document"]:
@@ -393,15 +572,15 @@ class TestRecordManager:
 
 	def _append_to_log(self, index_doctype, records: list["Document"]):
 		entry = {"doctype": index_doctype, "records": records}
-		with self.log_file.open("a") as f:
-			f.write(frappe.as_json(entry, indent=None) + "\n")
+		with self.log_file.open("ab") as f:
+			f.write(_dump_log_entry(entry))
 
 	def _read_log(self):
 		log = {}
 		if self.log_file.exists():
-			with self.log_file.open() as f:
+			with self.log_file.open("rb") as f:
 				for line in f:
-					entry = json.loads(line)
+					entry = _json_loads(line)
 					index_doctype = entry["doctype"]
 					records = entry["records"]
 					try:
@@ -415,15 +594,31 @@ class TestRecordManager:
 
 	def _remove_from_log(self, index_doctype):
 		temp_file = self.log_file.with_suffix(".temp")
-		with self.log_file.open("r") as input_file, temp_file.open("w") as output_file:
+		with self.log_file.open("rb") as input_file, temp_file.open("wb") as output_file:
 			for line in input_file:
-				entry = json.loads(line)
+				entry = _json_loads(line)
 				if entry["doctype"] != index_doctype:
 					output_file.write(line)
 		temp_file.replace(self.log_file)
 
 
+def _dump_log_entry(entry) -> bytes:
+	from frappe.utils.response import json_handler
+
+	if orjson:
+		# sorted keys and datetimes via json_handler as in frappe.as_json;
+		# unlike it, non-ASCII characters are written as raw UTF-8
+		return orjson.dumps(
+			entry,
+			default=json_handler,
+			option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE,
+		)
+	return (frappe.as_json(entry, indent=None, separators=(",", ":")) + "\n").encode()
+
+
 def _after_install_clear_test_log():
+	TestRecordManager.discard()
+	_clear_dependency_caches()
 	log_file_path = frappe.get_site_path(PERSISTENT_TEST_LOG_FILE)
 	if os.path.exists(log_file_path):
 		os.remove(log_file_path)